@@ -9,10 +9,14 @@ import base64
 import collections
 import concurrent.futures
 import configparser
+import contextlib
 import dataclasses
 import datetime
+import fnmatch
+import functools
+import gzip
 import hashlib
-import io
+import http.client
 import itertools
 import json
 import logging
@@ -20,16 +24,23 @@ import os.path
 import pprint
 import re
 import shelve
+import shutil
+import sqlite3
 import string
 import sys
+import tempfile
+import threading
 import time
 import typing as t
-import urllib.error
 import urllib.parse
-import urllib.request
 import zipfile
 from dataclasses import dataclass
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 minimal_required_python_version = (3, 11)
 if sys.version_info < minimal_required_python_version:
     raise SystemExit(
@@ -37,6 +48,20 @@ if sys.version_info < minimal_required_python_version:
         f"Python version detected: {sys.version.split(' ')[0]}"
     )
 
+if orjson is not None:
+    json_loads = orjson.loads
+    json_dumpb = orjson.dumps
+
+    def json_dumps(obj: t.Any) -> str:
+        return orjson.dumps(obj).decode()
+
+else:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+    def json_dumpb(obj: t.Any) -> bytes:
+        return json.dumps(obj).encode()
+
 
 BOT_ACCOUNT = "ansibot"
 
@@ -61,13 +86,49 @@ STALE_ISSUE_DAYS = 7
 NEEDS_INFO_WARN_DAYS = 14
 NEEDS_INFO_CLOSE_DAYS = 28
 WAITING_ON_CONTRIBUTOR_CLOSE_DAYS = 365
+STALE_PATHS_DAYS = 1
 SLEEP_SECONDS = 300
+FULL_LISTING_SECONDS = 3600
+# cached query results expire by age, by default after the length of the sleep
+# between daemon iterations
+QUERY_CACHE_TTL = SLEEP_SECONDS
+QUERY_CACHE_SIZE = 512
+CI_FAILURES_CACHE_SIZE = 256
+COMMITTERS_CACHE_TTL = 3600
+HTTP_USER_AGENT = "ansibotmini"
+MAX_REDIRECTS = 5
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.5
+RETRY_STATUSES = frozenset((502, 503, 504))
+# POST is left out, GraphQL mutations are not safe to repeat, read-only
+# queries are marked as such by the caller
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS"))
+HTTP_WORKERS = 8
+HTTP_TIMEOUT = 60
+# servers close idle keep-alive connections, do not reuse those idle for longer
+HTTP_IDLE_SECONDS = 30
+MUTATION_BATCH_SIZE = 50
+# stay well below GitHub's secondary rate limits
+GRAPHQL_MAX_REQUESTS_PER_SECOND = 10
+# nodes(ids: ...) accepts at most 100 ids per query
+FETCH_BATCH_SIZE = 50
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+COPY_BUFSIZE = 64 * 1024
 
 CONFIG_FILENAME = os.path.expanduser("~/.ansibotmini.cfg")
 CACHE_FILENAME = os.path.expanduser("~/.ansibotmini_cache")
+PATHS_CACHE_FILENAME = f"{CACHE_FILENAME}.paths"
+COLLECTIONS_CACHE_FILENAME = f"{CACHE_FILENAME}.collections"
+OBJECTS_CACHE_FILENAME = f"{CACHE_FILENAME}.sqlite3"
 config = configparser.ConfigParser()
 config.read(CONFIG_FILENAME)
 gh_token = config.get("default", "gh_token")
+# The rate limit is per account. Whitespace separated tokens of other accounts
+# take turns with gh_token for read-only queries. Mutations always use
+# gh_token so that the bot stays the author of labels and comments.
+gh_read_tokens = itertools.cycle(
+    [gh_token, *config.get("default", "gh_read_tokens", fallback="").split()]
+)
 azp_token = config.get("default", "azp_token")
 
 COMPONENT_RE = re.compile(
@@ -77,9 +138,18 @@ OBJ_TYPE_RE = re.compile(
     r"#{3,5}\sissue\stype(.+?)(?=#{3,5}|$)", flags=re.IGNORECASE | re.DOTALL
 )
 VERSION_RE = re.compile(r"ansible\s\[core\s([^]]+)]")
-COMPONENT_COMMAND_RE = re.compile(
-    r"^(?:@ansibot\s)?!component\s([=+-]\S+)$", flags=re.MULTILINE
+STRIKETHROUGH_RE = re.compile(r"~[^~]+~")
+COMPONENT_NOISE_RE = re.compile(
+    r"^(?:the )?(?:module )?(?:plugin )?|(?: plugin)?(?: module)?$"
+    r"|ansible\.(?:builtin|legacy)\.|\.py|\.ps1"
 )
+NON_COMPONENT_CHARS_RE = re.compile(r"[^a-zA-Z/._-]")
+MODULE_PATH_FLATTEN_RE = re.compile(r"(lib/ansible/modules)/(.*)(/.+\.(?:py|ps1))")
+CONNECTION_PATH_FLATTEN_RE = re.compile(
+    r"lib/ansible/(plugins/connection)/(.*)(/.+\.(?:py|ps1))"
+)
+MARKDOWN_CHARS_RE = re.compile(r"[*`\[\]]")
+MARKDOWN_LINK_TARGET_RE = re.compile(r"\([^)]+\)")
 
 VALID_COMMANDS = (
     "bot_skip",
@@ -90,8 +160,20 @@ VALID_COMMANDS = (
     "waiting_on_contributor",
     "!needs_collection_redirect",
 )
-COMMANDS_RE = re.compile(f"^({'|'.join(VALID_COMMANDS)})\s*$", flags=re.MULTILINE)
-RESOLVED_BY_PR_RE = re.compile(r"^resolved_by_pr\s([#0-9]+)\s*$", flags=re.MULTILINE)
+COMMANDS_RE = re.compile(
+    rf"^(?:(?P<command>{'|'.join(VALID_COMMANDS)})\s*"
+    r"|resolved_by_pr\s(?P<resolved_by_pr>[#0-9]+)\s*"
+    r"|(?:@ansibot\s)?!component\s(?P<component>[=+-]\S+))$",
+    flags=re.MULTILINE,
+)
+# most bodies contain no command, check for the keywords before running the regex
+COMMAND_KEYWORDS = (
+    *dict.fromkeys(command.removeprefix("!") for command in VALID_COMMANDS),
+    "resolved_by_pr",
+    "!component",
+)
+BOILERPLATE_RE = re.compile(r"<!--- boilerplate: (\S+) --->")
+CI_RESULTS_HASH_RE = re.compile(r"<!-- r_hash: (\S+) -->")
 
 ANSIBLE_PLUGINS = frozenset(
     (
@@ -126,9 +208,19 @@ ISSUE_TEMPLATE_SECTIONS = frozenset(
         "OS / Environment",
     )
 )
+ISSUE_TEMPLATE_SECTIONS_RE = tuple(
+    (
+        section,
+        re.compile(
+            r"^#{3,5}\s*%s\s*$" % re.escape(section),
+            flags=re.IGNORECASE | re.MULTILINE,
+        ),
+    )
+    for section in ISSUE_TEMPLATE_SECTIONS
+)
 
 QUERY_NUMBERS_TMPL = """
-query ($after: String) {
+query ($after: String, $field: IssueOrderField!, $direction: OrderDirection!) {
   rateLimit {
     limit
     cost
@@ -136,12 +228,13 @@ query ($after: String) {
     resetAt
   }
   repository(owner: "ansible", name: "ansible") {
-    %s(states: OPEN, first: 100, after: $after) {
+    %s(states: OPEN, first: 100, after: $after, orderBy: {field: $field, direction: $direction}) {
       pageInfo {
           hasNextPage
           endCursor
       }
       nodes {
+        id
         number
         updatedAt
         timelineItems(last: 1, itemTypes: [CROSS_REFERENCED_EVENT]) {
@@ -165,9 +258,6 @@ commits(last:1) {
       checkSuites(last:1) {
         nodes {
           updatedAt
-          app {
-            slug
-          }
         }
       }
     }
@@ -176,75 +266,90 @@ commits(last:1) {
 """,
 )
 
-QUERY_SINGLE_TMPL = """
-query($number: Int!)
-{
-  repository(owner: "ansible", name: "ansible") {
-    %s(number: $number) {
-      id
-      author {
-        login
-      }
-      number
-      title
-      body
-      labels (first: 20) {
-        nodes {
-          id
+TIMELINE_ITEM_TYPES = (
+    "[ISSUE_COMMENT, LABELED_EVENT, UNLABELED_EVENT, CROSS_REFERENCED_EVENT]"
+)
+
+TIMELINE_ITEMS_FIELDS = """
+pageInfo {
+    endCursor
+    hasNextPage
+}
+nodes {
+  __typename
+  ... on IssueComment {
+    createdAt
+    updatedAt
+    author {
+      login
+    }
+    body
+  }
+  ... on LabeledEvent {
+    createdAt
+    actor {
+      login
+    }
+    label {
+      name
+    }
+  }
+  ... on UnlabeledEvent {
+    createdAt
+    actor {
+      login
+    }
+    label {
+      name
+    }
+  }
+  ... on CrossReferencedEvent {
+    createdAt
+    source {
+      ... on PullRequest {
+        number
+        repository {
           name
-        }
-      }
-      timelineItems(first: 200, itemTypes: [ISSUE_COMMENT, LABELED_EVENT, UNLABELED_EVENT, CROSS_REFERENCED_EVENT]) {
-        pageInfo {
-            endCursor
-            hasNextPage
-        }
-        nodes {
-          __typename
-          ... on IssueComment {
-            createdAt
-            updatedAt
-            author {
-              login
-            }
-            body
-          }
-          ... on LabeledEvent {
-            createdAt
-            actor {
-              login
-            }
-            label {
-              name
-            }
-          }
-          ... on UnlabeledEvent {
-            createdAt
-            actor {
-              login
-            }
-            label {
+          owner {
+            ... on Organization {
               name
             }
           }
-          ... on CrossReferencedEvent {
-            createdAt
-            source {
-              ... on PullRequest {
-                number
-                repository {
-                  name
-                  owner {
-                    ... on Organization {
-                      name
-                    }
-                  }
-                }
-              }
-            }
-          }
         }
       }
+    }
+  }
+}
+"""
+
+OBJECT_FIELDS_TMPL = """
+id
+author {
+  login
+}
+number
+title
+body
+labels (first: 20) {
+  nodes {
+    id
+    name
+  }
+}
+timelineItems(first: 200, itemTypes: %s) {
+  %s
+}
+%s
+"""
+
+QUERY_SINGLE_TMPL = """
+query($number: Int!)
+{
+  repository(owner: "ansible", name: "ansible") {
+    issue(number: $number) {
+      %s
+    }
+    pullRequest(number: $number) {
       %s
     }
   }
@@ -257,10 +362,11 @@ query($number: Int!)
 }
 """
 
-QUERY_SINGLE_ISSUE = QUERY_SINGLE_TMPL % ("issue", "")
+ISSUE_FIELDS = OBJECT_FIELDS_TMPL % (TIMELINE_ITEM_TYPES, TIMELINE_ITEMS_FIELDS, "")
 
-QUERY_SINGLE_PR = QUERY_SINGLE_TMPL % (
-    "pullRequest",
+PR_FIELDS = OBJECT_FIELDS_TMPL % (
+    TIMELINE_ITEM_TYPES,
+    TIMELINE_ITEMS_FIELDS,
     """
 baseRef {
   name
@@ -284,9 +390,6 @@ last_commit: commits(last: 1) {
           conclusion
           updatedAt
           status
-          app {
-            name
-          }
         }
       }
     }
@@ -327,18 +430,115 @@ closingIssuesReferences(last: 1) {
 """,
 )
 
+# a number is either an issue or a PR, the other field resolves to null
+QUERY_SINGLE = QUERY_SINGLE_TMPL % (ISSUE_FIELDS, PR_FIELDS)
 
-@dataclass
+# GitHub returns at most 100 nodes per connection page
+QUERY_TIMELINE_TMPL = """
+query($id: ID!, $after: String)
+{
+  node(id: $id) {
+    ... on Issue {
+      timelineItems(first: 100, after: $after, itemTypes: %s) {
+        %s
+      }
+    }
+    ... on PullRequest {
+      timelineItems(first: 100, after: $after, itemTypes: %s) {
+        %s
+      }
+    }
+  }
+  rateLimit {
+    limit
+    cost
+    remaining
+    resetAt
+  }
+}
+"""
+
+QUERY_TIMELINE = QUERY_TIMELINE_TMPL % (
+    (TIMELINE_ITEM_TYPES, TIMELINE_ITEMS_FIELDS) * 2
+)
+
+QUERY_NODES = """
+query($ids: [ID!]!)
+{
+  nodes(ids: $ids) {
+    __typename
+    ... on Issue {
+      %s
+    }
+    ... on PullRequest {
+      %s
+    }
+  }
+  rateLimit {
+    limit
+    cost
+    remaining
+    resetAt
+  }
+}
+""" % (
+    ISSUE_FIELDS,
+    PR_FIELDS,
+)
+
+# queries are sent with every request, strip the indentation once
+(
+    QUERY_ISSUE_NUMBERS,
+    QUERY_PR_NUMBERS,
+    QUERY_SINGLE,
+    QUERY_TIMELINE,
+    QUERY_NODES,
+) = (
+    " ".join(query.split())
+    for query in (
+        QUERY_ISSUE_NUMBERS,
+        QUERY_PR_NUMBERS,
+        QUERY_SINGLE,
+        QUERY_TIMELINE,
+        QUERY_NODES,
+    )
+)
+
+
+@dataclass(slots=True)
 class Response:
     status_code: int
     reason: str
     raw_data: bytes
+    headers: http.client.HTTPMessage
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
 
     def json(self) -> t.Any:
-        return json.loads(self.raw_data.decode())
+        return json_loads(self.raw_data)
 
 
-@dataclass
+@dataclass(slots=True)
+class EventIndex:
+    last_labeled: dict[str, datetime.datetime] = dataclasses.field(default_factory=dict)
+    last_commented_by: dict[str, datetime.datetime] = dataclasses.field(
+        default_factory=dict
+    )
+    last_boilerplate: dict[str, dict[str, t.Any]] = dataclasses.field(
+        default_factory=dict
+    )
+    unlabeled_by: dict[str, set[str]] = dataclasses.field(
+        default_factory=lambda: collections.defaultdict(set)
+    )
+    ci_results_hashes: set[str] = dataclasses.field(default_factory=set)
+    by_type: dict[str, list[dict[str, t.Any]]] = dataclasses.field(
+        default_factory=lambda: collections.defaultdict(list)
+    )
+
+
+@dataclass(slots=True)
 class Issue:
     id: str
     author: str
@@ -346,13 +546,14 @@ class Issue:
     title: str
     body: str
     events: list[dict]
+    event_index: EventIndex
     labels: dict[str, str]
     updated_at: datetime.datetime
     components: list[str]
     last_triaged: datetime.datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class PR(Issue):
     branch: str
     files: list[str]
@@ -366,7 +567,7 @@ class PR(Issue):
     has_issue: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class CI:
     build_id: int
     conclusion: str
@@ -374,26 +575,46 @@ class CI:
     updated_at: datetime.datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Command:
     updated_at: datetime.datetime
     arg: t.Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Actions:
-    to_label: list[str] = dataclasses.field(default_factory=list)
-    to_unlabel: list[str] = dataclasses.field(default_factory=list)
+    to_label: set[str] = dataclasses.field(default_factory=set)
+    to_unlabel: set[str] = dataclasses.field(default_factory=set)
     comments: list[str] = dataclasses.field(default_factory=list)
     cancel_ci: bool = False
     close: bool = False
 
+    def __bool__(self) -> bool:
+        return bool(
+            self.to_label
+            or self.to_unlabel
+            or self.comments
+            or self.cancel_ci
+            or self.close
+        )
+
+
+@dataclass(slots=True)
+class Mutation:
+    name: str
+    input_type: str
+    input: dict[str, t.Any]
 
-@dataclass
+
+@dataclass(slots=True)
 class TriageContext:
     collections_list: dict[str, t.Any]
     collections_file_map: dict[str, t.Any]
-    committers: list[str]
+    committers: frozenset[str]
+    executor: concurrent.futures.Executor
+    now: datetime.datetime = dataclasses.field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc)
+    )
     commands_found: dict[str, list[Command]] = dataclasses.field(default_factory=dict)
 
 
@@ -401,222 +622,469 @@ GH_OBJ = t.TypeVar("GH_OBJ", Issue, PR)
 GH_OBJ_T = t.TypeVar("GH_OBJ_T", t.Type[Issue], t.Type[PR])
 
 request_counter = 0
+request_counter_lock = threading.Lock()
+# idle keep-alive connections shared by all threads,
+# (scheme, netloc) -> [(connection, idle since)]
+idle_connections: dict[
+    tuple[str, str], list[tuple[http.client.HTTPConnection, float]]
+] = collections.defaultdict(list)
+idle_connections_lock = threading.Lock()
+# query digest -> (expires at, response)
+query_cache: dict[bytes, tuple[float, Response]] = {}
+query_cache_lock = threading.Lock()
+# (build id, updated at) -> (failed job ids, artifact urls), None if not available
+ci_failures_cache: dict[
+    tuple[int, datetime.datetime], tuple[frozenset[str], tuple[str, ...]] | None
+] = {}
+graphql_next_slot = 0.0
+graphql_next_slot_lock = threading.Lock()
+label_id_cache: dict[str, str] = {}
+# url -> (etag, parsed data)
+collections_cache: dict[str, tuple[str, t.Any]] = {}
+collections_cache_lock = threading.Lock()
+
+
+def get_connection(scheme: str, netloc: str) -> tuple[http.client.HTTPConnection, bool]:
+    # returns the connection and whether it is a reused one
+    stale = []
+    conn = None
+    with idle_connections_lock:
+        idle = idle_connections[(scheme, netloc)]
+        while idle:
+            candidate, idle_since = idle.pop()
+            if time.monotonic() - idle_since < HTTP_IDLE_SECONDS:
+                conn = candidate
+                break
+            stale.append(candidate)
+    for candidate in stale:
+        candidate.close()
+    if conn is not None:
+        return conn, True
+
+    conn_cls = (
+        http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    )
+    return conn_cls(netloc, timeout=HTTP_TIMEOUT), False
 
 
-def http_request(
+def release_connection(
+    scheme: str, netloc: str, conn: http.client.HTTPConnection
+) -> None:
+    with idle_connections_lock:
+        idle = idle_connections[(scheme, netloc)]
+        if len(idle) < HTTP_WORKERS:
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+@contextlib.contextmanager
+def http_open(
     url: str,
-    data: str = "",
+    data: bytes = b"",
     headers: t.Optional[t.MutableMapping[str, str]] = None,
     method: str = "GET",
-) -> Response:
+    read_only: bool = False,
+) -> t.Iterator[http.client.HTTPResponse]:
+    # the connection goes back to the pool only if the response was read to the end
     global request_counter
-    if headers is None:
-        headers = {}
+    headers = {
+        "User-Agent": HTTP_USER_AGENT,
+        "Connection": "keep-alive",
+        **(headers or {}),
+    }
+    body = data or None
+    method = method.upper()
+    repeatable = read_only or method in IDEMPOTENT_METHODS
 
-    try:
-        with urllib.request.urlopen(
-            urllib.request.Request(
-                url, data=data.encode("ascii"), headers=headers, method=method.upper()
-            ),
-        ) as response:
+    redirects = retries = 0
+    while True:
+        parts = urllib.parse.urlsplit(url)
+        path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        conn, reused = get_connection(parts.scheme, parts.netloc)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+        except (
+            http.client.RemoteDisconnected,
+            ConnectionResetError,
+            BrokenPipeError,
+        ):
+            # the server closed the connection before responding. A reused
+            # kept-alive connection was most likely closed while idle, otherwise
+            # the server may have processed the request already so only requests
+            # safe to repeat are re-sent
+            conn.close()
+            if not (reused or repeatable):
+                raise
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+
+        with request_counter_lock:
             request_counter += 1
-            logging.info(
-                f"http request no. {request_counter}: {method} {url}: {response.status}, {response.reason}"
-            )
-            return Response(
-                status_code=response.status,
-                reason=response.reason,
-                raw_data=response.read(),
-            )
-    except urllib.error.HTTPError as e:
-        return Response(
-            status_code=e.status,
-            reason=e.reason,
-            raw_data=b"",
+            request_no = request_counter
+        logging.info(
+            f"http request no. {request_no}: {method} {url}: {response.status}, {response.reason}"
         )
 
+        if response.status in (301, 302, 303, 307, 308) and (
+            location := response.getheader("Location")
+        ):
+            response.read()
+            release_connection(parts.scheme, parts.netloc, conn)
+            if (redirects := redirects + 1) > MAX_REDIRECTS:
+                raise RuntimeError(f"Too many redirects when requesting {url}")
+            url = urllib.parse.urljoin(url, location)
+            if urllib.parse.urlsplit(url).netloc != parts.netloc:
+                headers.pop("Authorization", None)
+            if response.status == 303:
+                method = "GET"
+                body = None
+                repeatable = True
+            continue
+
+        if response.status in RETRY_STATUSES and repeatable and retries < HTTP_RETRIES:
+            response.read()
+            release_connection(parts.scheme, parts.netloc, conn)
+            time.sleep(HTTP_RETRY_BACKOFF * 2**retries)
+            retries += 1
+            continue
+
+        try:
+            yield response
+        finally:
+            if response.isclosed():
+                release_connection(parts.scheme, parts.netloc, conn)
+            else:
+                conn.close()
+        return
 
-def send_query(data: str) -> Response:
+
+def http_request(
+    url: str,
+    data: bytes = b"",
+    headers: t.Optional[t.MutableMapping[str, str]] = None,
+    method: str = "GET",
+    read_only: bool = False,
+) -> Response:
+    with http_open(
+        url,
+        data,
+        headers={"Accept-Encoding": "gzip", **(headers or {})},
+        method=method,
+        read_only=read_only,
+    ) as response:
+        raw_data = response.read()
+    if response.getheader("Content-Encoding") == "gzip":
+        raw_data = gzip.decompress(raw_data)
+
+    return Response(
+        status_code=response.status,
+        reason=response.reason,
+        raw_data=raw_data,
+        headers=response.headers,
+    )
+
+
+def http_stream(url: str) -> t.IO[bytes]:
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    with http_open(url) as response:
+        shutil.copyfileobj(response, f, length=COPY_BUFSIZE)
+    f.seek(0)
+    return f
+
+
+def wait_for_graphql_slot() -> None:
+    # each request reserves the next free slot, the sleeping is done unlocked
+    global graphql_next_slot
+    with graphql_next_slot_lock:
+        now = time.monotonic()
+        slot = max(now, graphql_next_slot)
+        graphql_next_slot = slot + 1 / GRAPHQL_MAX_REQUESTS_PER_SECOND
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def send_query(
+    data: bytes, read_only: bool = False, token: t.Optional[str] = None
+) -> Response:
+    if token is None:
+        token = next(gh_read_tokens) if read_only else gh_token
+    wait_for_graphql_slot()
     return http_request(
         GITHUB_GRAPHQL_URL,
         method="POST",
         headers={
             "Accept": "application/json",
-            "Authorization": f"Bearer {gh_token}",
+            "Authorization": f"Bearer {token}",
         },
         data=data,
+        read_only=read_only,
     )
 
 
+def send_cached_query(
+    data: bytes, ttl: float = QUERY_CACHE_TTL, token: t.Optional[str] = None
+) -> Response:
+    # for read-only queries whose results can be reused for ttl seconds
+    key = hashlib.blake2b(data, digest_size=16).digest()
+    now = time.monotonic()
+    with query_cache_lock:
+        if (entry := query_cache.get(key)) is not None and entry[0] > now:
+            return entry[1]
+
+    resp = send_query(data, read_only=True, token=token)
+    # do not replay a failure to every caller for the whole ttl
+    if not resp.ok or "errors" in resp.json():
+        return resp
+
+    with query_cache_lock:
+        if len(query_cache) >= QUERY_CACHE_SIZE:
+            for expired in [k for k, (exp, _) in query_cache.items() if exp <= now]:
+                del query_cache[expired]
+        query_cache[key] = (now + ttl, resp)
+
+    return resp
+
+
 def get_label_id(name: str) -> str:
+    return get_label_ids([name])[0]
+
+
+def get_label_ids(names: t.Collection[str]) -> list[str]:
+    if missing := [name for name in dict.fromkeys(names) if name not in label_id_cache]:
+        query = """
+        {
+          repository(owner: "ansible", name: "ansible") {
+            %s
+          }
+        }
+        """
+        resp = send_cached_query(
+            json_dumpb(
+                {
+                    "query": query
+                    % " ".join(
+                        f"label{i}: label(name: {json_dumps(name)}) {{ id }}"
+                        for i, name in enumerate(missing)
+                    ),
+                }
+            )
+        )
+        data = resp.json()["data"]["repository"]
+        for i, name in enumerate(missing):
+            label_id_cache[name] = data[f"label{i}"]["id"]
+
+    return [label_id_cache[name] for name in names]
+
+
+def load_label_ids() -> None:
     query = """
-    query ($name: String!){
+    query ($after: String) {
       repository(owner: "ansible", name: "ansible") {
-        label(name: $name) {
-          id
+        labels(first: 100, after: $after) {
+          pageInfo {
+            hasNextPage
+            endCursor
+          }
+          nodes {
+            id
+            name
+          }
         }
       }
     }
     """
-    resp = send_query(
-        json.dumps(
-            {
-                "query": query,
-                "variables": {"name": name},
-            }
+    variables = {}
+    while True:
+        resp = send_query(
+            json_dumpb({"query": query, "variables": variables}), read_only=True
         )
-    )
+        labels = resp.json()["data"]["repository"]["labels"]
+        label_id_cache.update((node["name"], node["id"]) for node in labels["nodes"])
+        if not labels["pageInfo"]["hasNextPage"]:
+            break
+        variables["after"] = labels["pageInfo"]["endCursor"]
 
-    data = resp.json()["data"]
-    return data["repository"]["label"]["id"]
 
+def load_collections_cache() -> None:
+    with shelve.open(COLLECTIONS_CACHE_FILENAME) as cache:
+        collections_cache.update(cache)
 
-def add_labels(obj: GH_OBJ, labels: list[str]) -> None:
-    # TODO gather label IDs globally from processed issues to limit API calls to get IDs
-    query = """
-    mutation($input: AddLabelsToLabelableInput!) {
-      addLabelsToLabelable(input:$input) {
-        clientMutationId
-      }
-    }
-    """
-    send_query(
-        json.dumps(
+
+def get_collections_data(url: str) -> t.Any:
+    etag, data = collections_cache.get(url, (None, None))
+    resp = http_request(url, headers={"If-None-Match": etag} if etag else None)
+    if resp.status_code == 304:
+        return data
+
+    data = resp.json()
+    if etag := resp.headers.get("ETag"):
+        collections_cache[url] = (etag, data)
+        with collections_cache_lock, shelve.open(COLLECTIONS_CACHE_FILENAME) as cache:
+            cache[url] = (etag, data)
+
+    return data
+
+
+def send_mutations(mutations: list[Mutation]) -> Response:
+    return send_query(
+        json_dumpb(
             {
-                "query": query,
-                "variables": {
-                    "input": {
-                        "labelIds": [get_label_id(label) for label in labels],
-                        "labelableId": obj.id,
-                    },
-                },
+                "query": mutation_document(mutations),
+                "variables": {f"input{i}": m.input for i, m in enumerate(mutations)},
             }
         )
     )
 
 
-def remove_labels(obj: GH_OBJ, labels: list[str]) -> None:
-    query = """
-    mutation($input: RemoveLabelsFromLabelableInput!) {
-      removeLabelsFromLabelable(input:$input) {
-        clientMutationId
-      }
-    }
-    """
-    send_query(
-        json.dumps(
-            {
-                "query": query,
-                "variables": {
-                    "input": {
-                        "labelIds": [obj.labels[label] for label in labels],
-                        "labelableId": obj.id,
-                    },
-                },
-            }
-        )
+def mutation_document(mutations: list[Mutation]) -> str:
+    # top-level fields of a mutation are executed serially, in the given order
+    variables, fields = zip(
+        *(mutation_fragments(i, m.name, m.input_type) for i, m in enumerate(mutations))
     )
+    return "mutation(%s) { %s }" % (", ".join(variables), " ".join(fields))
 
 
-def add_comment(obj: GH_OBJ, body: str) -> None:
-    query = """
-    mutation($input: AddCommentInput!) {
-      addComment(input:$input) {
-        clientMutationId
-      }
-    }
-    """
-    send_query(
-        json.dumps(
-            {
-                "query": query,
-                "variables": {
-                    "input": {
-                        "body": body,
-                        "subjectId": obj.id,
-                    },
-                },
-            }
-        )
+@functools.lru_cache(maxsize=1024)
+def mutation_fragments(index: int, name: str, input_type: str) -> tuple[str, str]:
+    # a batch is a sequence of a few mutation names at positions bounded by
+    # about MUTATION_BATCH_SIZE, so the fragments repeat across batches
+    return (
+        f"$input{index}: {input_type}!",
+        f"m{index}: {name}(input: $input{index}) {{ clientMutationId }}",
     )
 
 
-def close_issue(obj_id: str) -> None:
-    query = """
-    mutation($input: CloseIssueInput!) {
-      closeIssue(input:$input) {
-        clientMutationId
-      }
-    }
-    """
-    send_query(
-        json.dumps(
-            {
-                "query": query,
-                "variables": {
-                    "input": {
-                        "issueId": obj_id,
-                    },
-                },
-            }
-        )
+# collects mutations of many objects and sends them in batches, numbers of
+# objects whose mutations failed end up in failed
+class MutationBatcher:
+    def __init__(self, executor: concurrent.futures.Executor) -> None:
+        self.executor = executor
+        self.mutations: list[Mutation] = []
+        # the object each mutation belongs to
+        self.objects: list[GH_OBJ] = []
+        self.futures: dict[concurrent.futures.Future, list[GH_OBJ]] = {}
+        self.failed: set[int] = set()
+
+    def add(self, obj: GH_OBJ, mutations: list[Mutation]) -> None:
+        # mutations of one object are never split so they run in the given order
+        self.mutations.extend(mutations)
+        self.objects.extend(obj for _ in mutations)
+        if len(self.mutations) >= MUTATION_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.mutations:
+            future = self.executor.submit(send_mutations, self.mutations)
+            self.futures[future] = self.objects
+            self.mutations = []
+            self.objects = []
+
+    def __enter__(self) -> MutationBatcher:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+        for future in concurrent.futures.as_completed(self.futures):
+            objects = self.futures[future]
+            try:
+                resp = future.result()
+            except (OSError, http.client.HTTPException) as e:
+                self.fail(objects, repr(e))
+                continue
+            if not resp.ok:
+                self.fail(objects, f"{resp.status_code}, {resp.reason}")
+                continue
+            for error in resp.json().get("errors", ()):
+                # the path of a failed mutation is its alias, m<index>
+                match error.get("path"):
+                    case [str(alias), *_] if alias[1:].isdigit():
+                        self.fail([objects[int(alias[1:])]], error["message"])
+                    case _:
+                        self.fail(objects, error["message"])
+
+    def fail(self, objects: list[GH_OBJ], reason: str) -> None:
+        for number in sorted({obj.number for obj in objects} - self.failed):
+            logging.error(f"Failed to apply actions to #{number}: {reason}")
+            self.failed.add(number)
+
+
+def add_labels(obj: GH_OBJ, labels: t.Collection[str]) -> Mutation:
+    return Mutation(
+        name="addLabelsToLabelable",
+        input_type="AddLabelsToLabelableInput",
+        input={
+            "labelIds": get_label_ids(labels),
+            "labelableId": obj.id,
+        },
     )
 
 
-def close_pr(obj_id: str) -> None:
-    query = """
-    mutation($input: ClosePullRequestInput!) {
-      closePullRequest(input:$input) {
-        clientMutationId
-      }
-    }
-    """
-    send_query(
-        json.dumps(
-            {
-                "query": query,
-                "variables": {
-                    "input": {
-                        "pullRequestId": obj_id,
-                    },
-                },
-            }
-        )
+def remove_labels(obj: GH_OBJ, labels: t.Collection[str]) -> Mutation:
+    return Mutation(
+        name="removeLabelsFromLabelable",
+        input_type="RemoveLabelsFromLabelableInput",
+        input={
+            "labelIds": [obj.labels[label] for label in labels],
+            "labelableId": obj.id,
+        },
+    )
+
+
+def add_comment(obj: GH_OBJ, body: str) -> Mutation:
+    return Mutation(
+        name="addComment",
+        input_type="AddCommentInput",
+        input={
+            "body": body,
+            "subjectId": obj.id,
+        },
     )
 
 
-def close_object(obj: GH_OBJ) -> None:
+def close_object(obj: GH_OBJ) -> Mutation:
     logging.info(f"{obj.__class__.__name__} #{obj.number}: closing")
-    if isinstance(obj, Issue):
-        close_issue(obj.id)
-    elif isinstance(obj, PR):
-        close_pr(obj.id)
+    # PR is a subclass of Issue, check for it first
+    if isinstance(obj, PR):
+        return Mutation(
+            name="closePullRequest",
+            input_type="ClosePullRequestInput",
+            input={"pullRequestId": obj.id},
+        )
+    return Mutation(
+        name="closeIssue",
+        input_type="CloseIssueInput",
+        input={"issueId": obj.id},
+    )
 
 
-def get_pr_state(number: int) -> str:
+def get_pr_states(numbers: list[int]) -> dict[int, str]:
     query = """
-    query($number: Int!)
     {
       repository(owner: "ansible", name: "ansible") {
-        pullRequest(number: $number) {
-          state
-        }
+        %s
       }
     }
     """
-    resp = send_query(
-        json.dumps(
+    numbers = list(dict.fromkeys(numbers))
+    resp = send_cached_query(
+        json_dumpb(
             {
-                "query": query,
-                "variables": {"number": number},
+                "query": query
+                % " ".join(
+                    f"pr{i}: pullRequest(number: {number}) {{ state }}"
+                    for i, number in enumerate(numbers)
+                ),
             }
         )
     )
 
-    return resp.json()["data"]["repository"]["pullRequest"]["state"]
+    data = resp.json()["data"]["repository"]
+    return {number: data[f"pr{i}"]["state"] for i, number in enumerate(numbers)}
 
 
-def get_committers() -> list[str]:
+def get_committers() -> frozenset[str]:
     query = """
     query {
       organization(login: "ansible") {
@@ -630,12 +1098,15 @@ def get_committers() -> list[str]:
       }
     }
     """
-    resp = send_query(json.dumps({"query": query}))
+    # other accounts in gh_read_tokens may not see the team members
+    resp = send_cached_query(
+        json_dumpb({"query": query}), ttl=COMMITTERS_CACHE_TTL, token=gh_token
+    )
 
-    return [
+    return frozenset(
         n["login"]
         for n in resp.json()["data"]["organization"]["team"]["members"]["nodes"]
-    ]
+    )
 
 
 def process_component(data):
@@ -656,25 +1127,10 @@ def process_component(data):
                         c = c.split("#")[0]
                     c.replace("\\", "").strip()
                 else:
-                    c = (
-                        c.lower()
-                        .removeprefix("the ")
-                        .removeprefix("module ")
-                        .removeprefix("plugin ")
-                        .removesuffix(" module")
-                        .removesuffix(" plugin")
-                        .replace("ansible.builtin.", "")
-                        .replace("ansible.legacy.", "")
-                        .replace(".py", "")
-                        .replace(".ps1", "")
-                    )
+                    c = COMPONENT_NOISE_RE.sub("", c.lower())
 
-                if c := re.sub(r"[^a-zA-Z/._-]", "", c):
-                    if (
-                        flatten := re.sub(
-                            r"(lib/ansible/modules)/(.*)(/.+\.(?:py|ps1))", r"\1\3", c
-                        )
-                    ) != c:
+                if c := NON_COMPONENT_CHARS_RE.sub("", c):
+                    if (flatten := MODULE_PATH_FLATTEN_RE.sub(r"\1\3", c)) != c:
                         rv.append(flatten)
                     if len(c) > 1:
                         rv.append(c)
@@ -686,6 +1142,12 @@ def get_template_path(name: str) -> str:
     return os.path.join(os.path.dirname(__file__), "templates", f"{name}.tmpl")
 
 
+@functools.cache
+def load_template(name: str) -> string.Template:
+    with open(get_template_path(name)) as f:
+        return string.Template(f.read())
+
+
 def match_existing_components(filenames: list[str]) -> list[str]:
     if not filenames:
         return []
@@ -706,72 +1168,71 @@ def match_existing_components(filenames: list[str]) -> list[str]:
     """
     paths = ["lib/ansible/modules/", "bin/", "lib/ansible/cli/"]
     paths.extend((f"lib/ansible/plugins/{name}/" for name in ANSIBLE_PLUGINS))
-    files = []
-    component_to_path = {}
-    for i, filename in enumerate(filenames):
+    candidates = []
+    for filename in filenames:
         if "/" in filename:
-            query_name = f"file{i}"
-            files.append(file_fmt % (query_name, filename))
-            component_to_path[query_name] = filename
+            candidates.append(filename)
         else:
-            for j, path in enumerate(paths):
-                query_name = f"file{i}{j}"
-                fname = f"{path}{filename}.py"
-                files.append(file_fmt % (query_name, fname))
-                component_to_path[query_name] = fname
+            candidates.extend((f"{path}{filename}.py" for path in paths))
+    candidates = list(dict.fromkeys(candidates))
+
+    exists = {}
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with shelve.open(PATHS_CACHE_FILENAME) as cache:
+        unknown = []
+        for candidate in candidates:
+            cached = cache.get(candidate)
+            if cached is not None and days_since(cached[1], now) < STALE_PATHS_DAYS:
+                exists[candidate] = cached[0]
+            else:
+                unknown.append(candidate)
+
+        if unknown:
+            resp = send_cached_query(
+                json_dumpb(
+                    {
+                        "query": query_fmt
+                        % " ".join(
+                            file_fmt % (f"file{i}", candidate)
+                            for i, candidate in enumerate(unknown)
+                        )
+                    }
+                )
+            )
+            data = resp.json()["data"]["repository"]
+            for i, candidate in enumerate(unknown):
+                exists[candidate] = data[f"file{i}"] is not None
+                cache[candidate] = (exists[candidate], now)
 
-    resp = send_query(json.dumps({"query": query_fmt % " ".join(files)}))
-    return [
-        component_to_path[file]
-        for file, res in resp.json()["data"]["repository"].items()
-        if res is not None
-    ]
+    return [candidate for candidate in candidates if exists[candidate]]
 
 
 def last_labeled(obj: GH_OBJ, name: str) -> datetime.datetime:
-    return max(
-        (
-            e["created_at"]
-            for e in obj.events
-            if e["name"] == "LabeledEvent" and e["label"] == name
-        )
-    )
+    return obj.event_index.last_labeled[name]
 
 
 def last_commented_by(obj: GH_OBJ, name: str) -> datetime.datetime | None:
-    return max(
-        (
-            e["created_at"]
-            for e in obj.events
-            if e["name"] == "IssueComment" and e["author"] == name
-        ),
-        default=None,
-    )
+    return obj.event_index.last_commented_by.get(name)
 
 
 def last_boilerplate(obj: GH_OBJ, name: str) -> dict[str, t.Any] | None:
-    return max(
-        (
-            e
-            for e in obj.events
-            if e["name"] == "IssueComment"
-            and e["author"] == BOT_ACCOUNT
-            and f"<!--- boilerplate: {name} --->" in e["body"]
-        ),
-        key=lambda x: x["created_at"],
-        default=None,
-    )
+    return obj.event_index.last_boilerplate.get(name)
 
 
-def days_since(when: datetime.datetime) -> int:
-    return (datetime.datetime.now(datetime.timezone.utc) - when).days
+def days_since(when: datetime.datetime, now: datetime.datetime) -> int:
+    return (now - when).days
+
+
+@functools.lru_cache(maxsize=8192)
+def parse_datetime(value: str) -> datetime.datetime:
+    # the same timestamps repeat across comments, reviews, commits and runs
+    return datetime.datetime.fromisoformat(value)
 
 
 def resolved_by_pr(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if commands := ctx.commands_found.get("resolved_by_pr"):
-        if all(
-            get_pr_state(int(command.arg)).lower() == "merged" for command in commands
-        ):
+        states = get_pr_states([int(command.arg) for command in commands])
+        if all(state.lower() == "merged" for state in states.values()):
             actions.close = True
 
 
@@ -786,27 +1247,29 @@ def match_components(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
             existing_components = match_existing_components(processed_components)
 
         command_components = []
+        # dict as an ordered set
+        components = dict.fromkeys(existing_components)
         for command in ctx.commands_found.get("component", []):
             op, path = command.arg[0], command.arg[1:]
             command_components.append(path)
             match op:
                 case "=":
-                    existing_components = [path]
+                    components = {path: None}
                 case "+":
-                    existing_components.append(path)
+                    components[path] = None
                 case "-":
-                    if path in existing_components:
-                        existing_components.remove(path)
+                    components.pop(path, None)
                 case _:
                     raise ValueError(
                         f"Incorrect operation for the component command: {op}"
                     )
+        existing_components = list(components)
         # FIXME check whether command components are valid
 
         post_comment = True
         if (comment := last_boilerplate(obj, "components_banner")) is not None:
             last_components = [
-                re.sub(r"[*`\[\]]", "", re.sub(r"\([^)]+\)", "", line)).strip()
+                MARKDOWN_CHARS_RE.sub("", MARKDOWN_LINK_TARGET_RE.sub("", line)).strip()
                 for line in comment["body"].splitlines()
                 if line.startswith("*")
             ]
@@ -814,12 +1277,11 @@ def match_components(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
 
         if post_comment:
             entries = [f"* `{component}`" for component in existing_components]
-            with open(get_template_path("components_banner")) as f:
-                actions.comments.append(
-                    string.Template(f.read()).substitute(
-                        components="\n".join(entries) if entries else None
-                    )
+            actions.comments.append(
+                load_template("components_banner").substitute(
+                    components="\n".join(entries) if entries else None
                 )
+            )
 
         if "!needs_collection_redirect" not in ctx.commands_found:
             entries = []
@@ -840,11 +1302,9 @@ def match_components(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
                 if "/" not in component:
                     continue
                 # TODO all plugins
-                flatten = re.sub(
-                    r"lib/ansible/(plugins/connection)/(.*)(/.+\.(?:py|ps1))",
-                    r"\1\3",
-                    component,
-                ).replace("lib/ansible/", "")
+                flatten = CONNECTION_PATH_FLATTEN_RE.sub(r"\1\3", component).replace(
+                    "lib/ansible/", ""
+                )
                 for fqcn in ctx.collections_file_map.get(flatten, []):
                     entries.append(
                         (
@@ -855,14 +1315,14 @@ def match_components(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
                 if entries:
                     break
             else:
-                for candidate in [
+                for candidate in (
                     f"plugins/{plugin_type}/{component}.{ext}"
                     for component, plugin_type, ext in itertools.product(
                         (c for c in processed_components if "/" not in c),
                         (itertools.chain(ANSIBLE_PLUGINS, ["modules"])),
                         ("py", "ps1"),
                     )
-                ]:
+                ):
                     for fqcn in ctx.collections_file_map.get(candidate, []):
                         entries.append(
                             (
@@ -888,13 +1348,12 @@ def match_components(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
                         f"* {candidate} -> {collection_info['repository']} "
                         f"({GALAXY_URL}{collection_info['namespace']}.{collection_info['name']})"
                     )
-                with open(get_template_path("collection_redirect")) as f:
-                    actions.comments.append(
-                        string.Template(f.read()).substitute(
-                            components="\n".join(assembled_entries)
-                        )
+                actions.comments.append(
+                    load_template("collection_redirect").substitute(
+                        components="\n".join(assembled_entries)
                     )
-                actions.to_label.append("bot_closed")
+                )
+                actions.to_label.add("bot_closed")
                 actions.close = True
 
     obj.components = existing_components
@@ -905,155 +1364,172 @@ def match_components(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
 
 
 def needs_triage(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
-    if not any(
-        e
-        for e in obj.events
-        if e["name"] == "LabeledEvent" and e["label"] in ("needs_triage", "triage")
-    ):
-        actions.to_label.append("needs_triage")
+    if not obj.event_index.last_labeled.keys() & {"needs_triage", "triage"}:
+        actions.to_label.add("needs_triage")
 
 
 def waiting_on_contributor(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if "waiting_on_contributor" in ctx.commands_found:
-        actions.to_label.append("waiting_on_contributor")
+        actions.to_label.add("waiting_on_contributor")
     if (
         "waiting_on_contributor" in obj.labels
-        and days_since(last_labeled(obj, "waiting_on_contributor"))
+        and days_since(last_labeled(obj, "waiting_on_contributor"), ctx.now)
         > WAITING_ON_CONTRIBUTOR_CLOSE_DAYS
     ):
         actions.close = True
-        actions.to_label.append("bot_closed")
-        actions.to_unlabel.append("waiting_on_contributor")
-        with open(get_template_path("waiting_on_contributor")) as f:
-            actions.comments.append(f.read())
+        actions.to_label.add("bot_closed")
+        actions.to_unlabel.add("waiting_on_contributor")
+        actions.comments.append(load_template("waiting_on_contributor").template)
 
 
 def needs_info(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if "needs_info" in ctx.commands_found:
-        actions.to_label.append("needs_info")
+        actions.to_label.add("needs_info")
 
     if "needs_info" in obj.labels or "needs_info" in actions.to_label:
         labeled_datetime = last_labeled(obj, "needs_info")
         commented_datetime = last_commented_by(obj, obj.author)
         if commented_datetime is None or labeled_datetime > commented_datetime:
-            days_labeled = days_since(labeled_datetime)
+            days_labeled = days_since(labeled_datetime, ctx.now)
             if days_labeled > NEEDS_INFO_CLOSE_DAYS:
                 actions.close = True
-                with open(get_template_path("needs_info_close")) as f:
-                    actions.comments.append(
-                        string.Template(f.read()).substitute(
-                            author=obj.author, object_type=obj.__class__.__name__
-                        )
+                actions.comments.append(
+                    load_template("needs_info_close").substitute(
+                        author=obj.author, object_type=obj.__class__.__name__
                     )
+                )
             elif days_labeled > NEEDS_INFO_WARN_DAYS:
                 last_warned = last_boilerplate(obj, "needs_info_warn")
                 if last_warned is None:
                     last_warned = last_boilerplate(obj, "needs_info_base")
                 if last_warned is None or last_warned["created_at"] < labeled_datetime:
-                    with open(get_template_path("needs_info_warn")) as f:
-                        actions.comments.append(
-                            string.Template(f.read()).substitute(
-                                author=obj.author,
-                                object_type=obj.__class__.__name__,
-                            )
+                    actions.comments.append(
+                        load_template("needs_info_warn").substitute(
+                            author=obj.author,
+                            object_type=obj.__class__.__name__,
                         )
+                    )
         else:
-            if "needs_info" in actions.to_label:
-                actions.to_label.remove("needs_info")
-            actions.to_unlabel.append("needs_info")
+            actions.to_label.discard("needs_info")
+            actions.to_unlabel.add("needs_info")
 
 
 def match_object_type(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if match := OBJ_TYPE_RE.search(obj.body):
-        data = re.sub(r"~[^~]+~", "", match.group(1).lower())
+        data = match.group(1).lower()
+        if "~" in data:
+            data = STRIKETHROUGH_RE.sub("", data)
         if "feature" in data:
-            actions.to_label.append("feature")
+            actions.to_label.add("feature")
         if "bug" in data:
-            actions.to_label.append("bug")
+            actions.to_label.add("bug")
         if "documentation" in data or "docs" in data:
-            actions.to_label.append("docs")
+            actions.to_label.add("docs")
         if "test" in data:
-            actions.to_label.append("test")
+            actions.to_label.add("test")
 
 
 def match_version(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if match := VERSION_RE.search(obj.body):
         label_name = f"affects_{'.'.join(match.group(1).split('.')[:2])}"
         if not any(
-            e
-            for e in obj.events
-            if e["name"] == "UnlabeledEvent"
-            and e["author"] in ctx.committers
-            and e["label"] == label_name
+            author in ctx.committers
+            for author in obj.event_index.unlabeled_by.get(label_name, ())
         ):
-            actions.to_label.append(label_name)
+            actions.to_label.add(label_name)
 
 
-def ci_comments(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
-    if not isinstance(obj, PR) or obj.ci is None:
-        return
-    resp = http_request(AZP_TIMELINE_URL_FMT % obj.ci.build_id)
+def get_ci_failures(
+    build_id: int, updated_at: datetime.datetime, executor: concurrent.futures.Executor
+) -> tuple[frozenset[str], tuple[str, ...]] | None:
+    # updated_at is only a part of the cache key so that re-runs of the same
+    # build are not served from the cache
+    key = (build_id, updated_at)
+    if key not in ci_failures_cache:
+        if len(ci_failures_cache) >= CI_FAILURES_CACHE_SIZE:
+            del ci_failures_cache[next(iter(ci_failures_cache))]
+        ci_failures_cache[key] = fetch_ci_failures(build_id, executor)
+    return ci_failures_cache[key]
+
+
+def fetch_ci_failures(
+    build_id: int, executor: concurrent.futures.Executor
+) -> tuple[frozenset[str], tuple[str, ...]] | None:
+    timeline = executor.submit(http_request, AZP_TIMELINE_URL_FMT % build_id)
+    artifacts = executor.submit(http_request, AZP_ARTIFACTS_URL_FMT % build_id)
+
+    resp = timeline.result()
     if resp.status_code == 404:
         # not available anymore
-        if obj.ci.conclusion == "success":
-            actions.to_unlabel.append("ci_verified")
-        return
-    failed_job_ids = [
+        return None
+    failed_job_ids = frozenset(
         r["id"]
         for r in resp.json()["records"]
         if r["type"] == "Job" and r["result"] == "failed"
-    ]
+    )
+    if not failed_job_ids:
+        return failed_job_ids, ()
+    artifact_urls = tuple(
+        a["resource"]["downloadUrl"]
+        for a in artifacts.result().json()["value"]
+        if a["name"].startswith("Bot ") and a["source"] in failed_job_ids
+    )
+    return failed_job_ids, artifact_urls
+
+
+def ci_comments(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
+    if not isinstance(obj, PR) or obj.ci is None:
+        return
+    if (
+        failures := get_ci_failures(obj.ci.build_id, obj.ci.updated_at, ctx.executor)
+    ) is None:
+        if obj.ci.conclusion == "success":
+            actions.to_unlabel.add("ci_verified")
+        return
+    failed_job_ids, artifact_urls = failures
     if not failed_job_ids:
-        actions.to_unlabel.append("ci_verified")
+        actions.to_unlabel.add("ci_verified")
         return
     ci_comment = []
     ci_verifieds = []
-    for url in (
-        a["resource"]["downloadUrl"]
-        for a in http_request(AZP_ARTIFACTS_URL_FMT % obj.ci.build_id).json()["value"]
-        if a["name"].startswith("Bot ") and a["source"] in failed_job_ids
-    ):
-        zfile = zipfile.ZipFile(io.BytesIO(http_request(url).raw_data))
-        for filename in zfile.namelist():
-            if "ansible-test-" not in filename:
-                continue
-            with zfile.open(filename) as f:
-                artifact_data = json.load(f)
-                ci_verifieds.append(artifact_data["verified"])
-                for r in artifact_data["results"]:
-                    ci_comment.append(f"{r['message']}\n```\n{r['output']}\n```\n")
+    for artifact in ctx.executor.map(http_stream, artifact_urls):
+        with artifact, zipfile.ZipFile(artifact) as zfile:
+            for filename in fnmatch.filter(zfile.namelist(), "*ansible-test-*"):
+                with zfile.open(filename) as f:
+                    artifact_data = json_loads(f.read())
+                    ci_verifieds.append(artifact_data["verified"])
+                    for r in artifact_data["results"]:
+                        ci_comment.append(f"{r['message']}\n```\n{r['output']}\n```\n")
     if ci_comment:
         results = "\n".join(ci_comment)
-        r_hash = hashlib.md5(results.encode()).hexdigest()
-        if not any(
-            e
-            for e in obj.events
-            if e["name"] == "IssueComment"
-            and e["author"] == BOT_ACCOUNT
-            and "<!--- boilerplate: ci_test_result --->" in e["body"]
-            and f"<!-- r_hash: {r_hash} -->" in e["body"]
+        encoded_results = results.encode()
+        r_hash = hashlib.blake2b(encoded_results, digest_size=16).hexdigest()
+        if (
+            r_hash not in obj.event_index.ci_results_hashes
+            # comments posted before switching to blake2b carry md5 hashes
+            and hashlib.md5(encoded_results, usedforsecurity=False).hexdigest()
+            not in obj.event_index.ci_results_hashes
         ):
-            with open(get_template_path("ci_test_results")) as f:
-                actions.comments.append(
-                    string.Template(f.read()).substitute(
-                        results=results,
-                        r_hash=r_hash,
-                    )
+            actions.comments.append(
+                load_template("ci_test_results").substitute(
+                    results=results,
+                    r_hash=r_hash,
                 )
+            )
     # ci_verified
     if all(ci_verifieds) and len(ci_verifieds) == len(failed_job_ids):
-        actions.to_label.append("ci_verified")
+        actions.to_label.add("ci_verified")
     else:
-        actions.to_unlabel.append("ci_verified")
+        actions.to_unlabel.add("ci_verified")
 
 
 def needs_revision(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if not isinstance(obj, PR) or obj.ci is None:
         return
     if obj.changes_requested or obj.ci.conclusion != "success":
-        actions.to_label.append("needs_revision")
+        actions.to_label.add("needs_revision")
     else:
-        actions.to_unlabel.append("needs_revision")
+        actions.to_unlabel.add("needs_revision")
 
 
 def needs_ci(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
@@ -1062,71 +1538,71 @@ def needs_ci(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     label = "needs_ci"
     if obj.ci is None or obj.ci.status != "completed":
         if "pre_azp" not in obj.labels:
-            actions.to_label.append(label)
+            actions.to_label.add(label)
     else:
-        actions.to_unlabel.append(label)
-        actions.to_unlabel.append("pre_azp")
+        actions.to_unlabel.add(label)
+        actions.to_unlabel.add("pre_azp")
 
 
 def stale_ci(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if not isinstance(obj, PR) or obj.ci is None:
         return
-    if days_since(obj.ci.updated_at) > STALE_CI_DAYS:
-        actions.to_label.append("stale_ci")
+    if days_since(obj.ci.updated_at, ctx.now) > STALE_CI_DAYS:
+        actions.to_label.add("stale_ci")
     else:
-        actions.to_unlabel.append("stale_ci")
+        actions.to_unlabel.add("stale_ci")
 
 
 def docs_only(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if not isinstance(obj, PR):
         return
     if all(c.startswith("docs/") for c in obj.components):
-        actions.to_label.append("docs_only")
+        actions.to_label.add("docs_only")
         if last_boilerplate(obj, "docs_team_info") is None:
-            with open(get_template_path("docs_team_info")) as f:
-                actions.comments.append(f.read())
+            actions.comments.append(load_template("docs_team_info").template)
 
 
 def backport(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if not isinstance(obj, PR):
         return
     if obj.branch.startswith("stable-"):
-        actions.to_label.append("backport")
+        actions.to_label.add("backport")
     else:
-        actions.to_unlabel.append("backport")
+        actions.to_unlabel.add("backport")
 
 
 def is_module(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if any(c.startswith("lib/ansible/modules/") for c in obj.components):
-        actions.to_label.append("module")
+        actions.to_label.add("module")
     else:
-        actions.to_unlabel.append("module")
+        actions.to_unlabel.add("module")
 
 
 def needs_rebase(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if not isinstance(obj, PR):
         return
     if obj.mergeable == "conflicting":
-        actions.to_label.append("needs_rebase")
+        actions.to_label.add("needs_rebase")
     else:
-        actions.to_unlabel.append("needs_rebase")
+        actions.to_unlabel.add("needs_rebase")
 
 
 def stale_review(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if not isinstance(obj, PR) or obj.last_review is None:
         return
     if obj.last_review < obj.last_commit:
-        actions.to_label.append("stale_review")
+        actions.to_label.add("stale_review")
     else:
-        actions.to_unlabel.append("stale_review")
+        actions.to_unlabel.add("stale_review")
 
 
 def pr_from_upstream(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if not isinstance(obj, PR) or obj.from_repo != "ansible/ansible":
         return
     actions.close = True
-    with open(get_template_path("pr_from_upstream")) as f:
-        actions.comments.append(string.Template(f.read()).substitute(author=obj.author))
+    actions.comments.append(
+        load_template("pr_from_upstream").substitute(author=obj.author)
+    )
     if obj.ci is not None:
         actions.cancel_ci = True
 
@@ -1142,7 +1618,7 @@ def cancel_ci(build_id: int) -> None:
                 base64.b64encode(f":{azp_token}".encode()).decode()
             ),
         },
-        data=json.dumps({"status": "Cancelling"}),
+        data=json_dumpb({"status": "Cancelling"}),
     )
     logging.info("Cancelled with status_code: %d", resp.status_code)
 
@@ -1157,55 +1633,44 @@ def bad_pr(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
 def linked_objs(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if isinstance(obj, PR):
         if obj.has_issue:
-            actions.to_label.append("has_issue")
+            actions.to_label.add("has_issue")
         else:
-            actions.to_unlabel.append("has_issue")
+            actions.to_unlabel.add("has_issue")
     elif isinstance(obj, Issue):
-        if [e for e in obj.events if e["name"] == "CrossReferencedEvent"]:
-            actions.to_label.append("has_pr")
+        if obj.event_index.by_type["CrossReferencedEvent"]:
+            actions.to_label.add("has_pr")
         else:
-            actions.to_unlabel.append("has_pr")
+            actions.to_unlabel.add("has_pr")
 
 
 def needs_template(obj: GH_OBJ, actions: Actions, ctx: TriageContext) -> None:
     if isinstance(obj, PR):
         return
     missing = []
-    for section in ISSUE_TEMPLATE_SECTIONS:
-        if (
-            re.search(
-                r"^#{3,5}\s*%s\s*$" % section,
-                obj.body,
-                flags=re.IGNORECASE | re.DOTALL | re.MULTILINE,
-            )
-            is None
-        ):
+    for section, section_re in ISSUE_TEMPLATE_SECTIONS_RE:
+        if section_re.search(obj.body) is None:
             missing.append(section)
     if missing:
-        actions.to_label.append("needs_template")
-        actions.to_label.append("needs_info")
+        actions.to_label.add("needs_template")
+        actions.to_label.add("needs_info")
         if last_boilerplate(obj, "issue_missing_data") is None:
-            with open(get_template_path("issue_missing_data")) as f:
-                actions.comments.append(
-                    string.Template(f.read()).substitute(
-                        author=obj.author,
-                        obj_type=obj.__class__.__name__,
-                        missing_sections="\n".join((f"- {s}" for s in missing)),
-                    )
+            actions.comments.append(
+                load_template("issue_missing_data").substitute(
+                    author=obj.author,
+                    obj_type=obj.__class__.__name__,
+                    missing_sections="\n".join((f"- {s}" for s in missing)),
                 )
+            )
     else:
-        actions.to_unlabel.append("needs_template")
+        actions.to_unlabel.add("needs_template")
         if (
-            not [
-                e
-                for e in obj.events
-                if e["name"] == "LabeledEvent"
-                and e["label"] == "needs_info"
-                and e["author"] != BOT_ACCOUNT
-            ]
+            not any(
+                e["label"] == "needs_info" and e["author"] != BOT_ACCOUNT
+                for e in obj.event_index.by_type["LabeledEvent"]
+            )
             and "needs_info" not in ctx.commands_found
         ):
-            actions.to_unlabel.append("needs_info")
+            actions.to_unlabel.add("needs_info")
 
 
 bot_funcs = [
@@ -1232,201 +1697,385 @@ bot_funcs = [
 ]
 
 
-def triage(objects: dict[str, GH_OBJ], dry_run: t.Optional[bool] = None) -> None:
-    ctx = TriageContext(
-        collections_list=http_request(COLLECTIONS_LIST_ENDPOINT).json(),
-        collections_file_map=http_request(COLLECTIONS_FILEMAP_ENDPOINT).json(),
-        committers=get_committers(),
-    )
-    for obj in objects.values():
-        logging.info(f"Triaging {obj.__class__.__name__} {obj.title} (#{obj.number})")
-        # commands
-        bodies = itertools.chain(
-            ((obj.body, obj.updated_at),),
-            (
-                (e["body"], e["updated_at"])
-                for e in obj.events
-                if e["name"] == "IssueComment"
-            ),
+def actions_to_mutations(obj: GH_OBJ, actions: Actions) -> list[Mutation]:
+    mutations = []
+    if actions.to_label:
+        mutations.append(add_labels(obj, actions.to_label))
+    if actions.to_unlabel:
+        mutations.append(remove_labels(obj, actions.to_unlabel))
+    mutations.extend(add_comment(obj, comment) for comment in actions.comments)
+    if actions.close:
+        mutations.append(close_object(obj))
+
+    return mutations
+
+
+def triage(objects: dict[str, GH_OBJ], dry_run: t.Optional[bool] = None) -> set[int]:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HTTP_WORKERS) as executor:
+        collections_list = executor.submit(
+            get_collections_data, COLLECTIONS_LIST_ENDPOINT
+        )
+        collections_file_map = executor.submit(
+            get_collections_data, COLLECTIONS_FILEMAP_ENDPOINT
         )
-        ctx.commands_found = collections.defaultdict(list)
-        for body, updated_at in bodies:
-            for command in COMMANDS_RE.findall(body):
-                ctx.commands_found[command].append(Command(updated_at=updated_at))
-            if match := RESOLVED_BY_PR_RE.search(body):
-                ctx.commands_found["resolved_by_pr"].append(
-                    Command(updated_at=updated_at, arg=match.group(1).removeprefix("#"))
+        committers = executor.submit(get_committers)
+        ctx = TriageContext(
+            collections_list=collections_list.result(),
+            collections_file_map=collections_file_map.result(),
+            committers=committers.result(),
+            executor=executor,
+        )
+        # mutations of different objects are independent, send them in batches
+        # in the background while the next objects are being triaged
+        pending = []
+        with MutationBatcher(executor) as batcher:
+            for obj in objects.values():
+                logging.info(
+                    f"Triaging {obj.__class__.__name__} {obj.title} (#{obj.number})"
+                )
+                # commands
+                bodies = itertools.chain(
+                    ((obj.body, obj.updated_at),),
+                    (
+                        (e["body"], e["updated_at"])
+                        for e in obj.event_index.by_type["IssueComment"]
+                    ),
                 )
-            for component in COMPONENT_COMMAND_RE.findall(body):
-                ctx.commands_found["component"].append(
-                    Command(updated_at=updated_at, arg=component)
+                ctx.now = datetime.datetime.now(datetime.timezone.utc)
+                ctx.commands_found = collections.defaultdict(list)
+                for body, updated_at in bodies:
+                    if not any(keyword in body for keyword in COMMAND_KEYWORDS):
+                        continue
+                    for match in COMMANDS_RE.finditer(body):
+                        match match.lastgroup:
+                            case "command":
+                                ctx.commands_found[match.group("command")].append(
+                                    Command(updated_at=updated_at)
+                                )
+                            case "resolved_by_pr":
+                                ctx.commands_found["resolved_by_pr"].append(
+                                    Command(
+                                        updated_at=updated_at,
+                                        arg=match.group("resolved_by_pr").removeprefix(
+                                            "#"
+                                        ),
+                                    )
+                                )
+                            case "component":
+                                ctx.commands_found["component"].append(
+                                    Command(
+                                        updated_at=updated_at,
+                                        arg=match.group("component"),
+                                    )
+                                )
+
+                is_bot_broken = "bot_broken" in ctx.commands_found and (
+                    "!bot_broken" not in ctx.commands_found
+                    or ctx.commands_found["bot_broken"][-1].updated_at
+                    > ctx.commands_found["!bot_broken"][-1].updated_at
                 )
+                is_bot_skip = "bot_skip" in ctx.commands_found and (
+                    "!bot_skip" not in ctx.commands_found
+                    or ctx.commands_found["bot_skip"][-1].updated_at
+                    > ctx.commands_found["!bot_skip"][-1].updated_at
+                )
+                if is_bot_broken:
+                    logging.info(
+                        f"Skipping {obj.__class__.__name__} {obj.title} (#{obj.number}) due to bot_broken"
+                    )
+                    if not dry_run:
+                        batcher.add(obj, [add_labels(obj, ["bot_broken"])])
+                    continue
+                else:
+                    if not dry_run and "bot_broken" in obj.labels:
+                        batcher.add(obj, [remove_labels(obj, ["bot_broken"])])
+                if is_bot_skip:
+                    logging.info(
+                        f"Skipping {obj.__class__.__name__} {obj.title} (#{obj.number}) due to bot_skip"
+                    )
+                    continue
 
-        is_bot_broken = "bot_broken" in ctx.commands_found and (
-            "!bot_broken" not in ctx.commands_found
-            or ctx.commands_found["bot_broken"][-1].updated_at
-            > ctx.commands_found["!bot_broken"][-1].updated_at
-        )
-        is_bot_skip = "bot_skip" in ctx.commands_found and (
-            "!bot_skip" not in ctx.commands_found
-            or ctx.commands_found["bot_skip"][-1].updated_at
-            > ctx.commands_found["!bot_skip"][-1].updated_at
-        )
-        if is_bot_broken:
-            logging.info(
-                f"Skipping {obj.__class__.__name__} {obj.title} (#{obj.number}) due to bot_broken"
-            )
-            if not dry_run:
-                add_labels(obj, ["bot_broken"])
-            continue
-        else:
-            if not dry_run:
-                remove_labels(obj, ["bot_broken"])
-        if is_bot_skip:
-            logging.info(
-                f"Skipping {obj.__class__.__name__} {obj.title} (#{obj.number}) due to bot_skip"
-            )
-            continue
+                # triage
+                actions = Actions()
+                for f in bot_funcs:
+                    f(obj, actions, ctx)
 
-        # triage
-        actions = Actions()
-        for f in bot_funcs:
-            f(obj, actions, ctx)
+                logging.debug(pprint.pformat(actions))
+                actions.to_label.difference_update(obj.labels)
+                actions.to_unlabel.intersection_update(obj.labels)
 
-        logging.debug(pprint.pformat(actions))
-        actions.to_label = [l for l in actions.to_label if l not in obj.labels]
-        actions.to_unlabel = [l for l in actions.to_unlabel if l in obj.labels]
+                if common_labels := actions.to_label & actions.to_unlabel:
+                    raise AssertionError(
+                        f"The following labels were scheduled to be both added and removed {', '.join(common_labels)}"
+                    )
 
-        if common_labels := set(actions.to_label).intersection(actions.to_unlabel):
-            raise AssertionError(
-                f"The following labels were scheduled to be both added and removed {', '.join(common_labels)}"
-            )
+                logging.info(pprint.pformat(actions))
+                if actions and not dry_run:
+                    if actions.cancel_ci:
+                        pending.append(executor.submit(cancel_ci, obj.ci.build_id))
+                    batcher.add(obj, actions_to_mutations(obj, actions))
 
-        logging.info(pprint.pformat(actions))
-        if not dry_run:
-            if actions.to_label:
-                add_labels(obj, actions.to_label)
-            if actions.to_unlabel:
-                remove_labels(obj, actions.to_unlabel)
+                logging.info(
+                    f"Done triaging {obj.__class__.__name__} {obj.title} (#{obj.number})"
+                )
 
-            for comment in actions.comments:
-                add_comment(obj, comment)
+        for future in concurrent.futures.as_completed(pending):
+            future.result()
 
-            if actions.cancel_ci:
-                cancel_ci(obj.ci.build_id)
+    # numbers of objects whose mutations failed
+    return batcher.failed
 
-            if actions.close:
-                close_object(obj)
 
-        logging.info(
-            f"Done triaging {obj.__class__.__name__} {obj.title} (#{obj.number})"
-        )
+def process_label_event(node: dict[str, t.Any]) -> dict[str, t.Any]:
+    return dict(
+        name=node["__typename"],
+        created_at=parse_datetime(node["createdAt"]),
+        label=node["label"]["name"],
+        author=node["actor"]["login"],
+    )
+
+
+def process_comment_event(node: dict[str, t.Any]) -> dict[str, t.Any]:
+    return dict(
+        name=node["__typename"],
+        created_at=parse_datetime(node["createdAt"]),
+        body=node["body"],
+        updated_at=parse_datetime(node["updatedAt"]),
+        author=node["author"]["login"] if node["author"] is not None else "",
+    )
+
 
+def process_cross_referenced_event(
+    node: dict[str, t.Any],
+) -> t.Optional[dict[str, t.Any]]:
+    if not (source := node["source"]):
+        return None
+    return dict(
+        name=node["__typename"],
+        created_at=parse_datetime(node["createdAt"]),
+        number=source["number"],
+        repo=source["repository"],
+        owner=source["repository"].get("owner", {}).get("name", ""),
+    )
+
+
+EVENT_PROCESSORS = {
+    "LabeledEvent": process_label_event,
+    "UnlabeledEvent": process_label_event,
+    "IssueComment": process_comment_event,
+    "CrossReferencedEvent": process_cross_referenced_event,
+}
 
-def process_events(issue: dict[str, t.Any]) -> list[dict[str, str]]:
+
+def process_events(issue: dict[str, t.Any]) -> list[dict[str, t.Any]]:
     rv = []
     for node in issue["timelineItems"]["nodes"]:
-        event = dict(
-            name=node["__typename"],
-            created_at=datetime.datetime.fromisoformat(node["createdAt"]),
-        )
-        if node["__typename"] in ["LabeledEvent", "UnlabeledEvent"]:
-            event["label"] = node["label"]["name"]
-            event["author"] = node["actor"]["login"]
-        elif node["__typename"] == "IssueComment":
-            event["body"] = node["body"]
-            event["updated_at"] = datetime.datetime.fromisoformat(node["updatedAt"])
-            event["author"] = (
-                node["author"]["login"] if node["author"] is not None else ""
-            )
-        elif node["__typename"] == "CrossReferencedEvent" and node["source"]:
-            event["number"] = node["source"]["number"]
-            event["repo"] = node["source"]["repository"]
-            event["owner"] = (
-                node["source"]["repository"].get("owner", {}).get("name", "")
-            )
-        else:
-            continue
-        rv.append(event)
+        if (process := EVENT_PROCESSORS.get(node["__typename"])) is not None and (
+            event := process(node)
+        ) is not None:
+            rv.append(event)
 
     return rv
 
 
-def get_gh_objects(obj_name: str) -> list[tuple[str, datetime.datetime]]:
-    query = QUERY_ISSUE_NUMBERS if obj_name == "issues" else QUERY_PR_NUMBERS
-    rv = []
-    variables = {}
+def index_events(events: list[dict[str, t.Any]]) -> EventIndex:
+    rv = EventIndex()
+    for e in events:
+        rv.by_type[e["name"]].append(e)
+        match e["name"]:
+            case "LabeledEvent":
+                rv.last_labeled[e["label"]] = max(
+                    e["created_at"], rv.last_labeled.get(e["label"], e["created_at"])
+                )
+            case "UnlabeledEvent":
+                rv.unlabeled_by[e["label"]].add(e["author"])
+            case "IssueComment":
+                rv.last_commented_by[e["author"]] = max(
+                    e["created_at"],
+                    rv.last_commented_by.get(e["author"], e["created_at"]),
+                )
+                if e["author"] == BOT_ACCOUNT:
+                    for name in BOILERPLATE_RE.findall(e["body"]):
+                        last = rv.last_boilerplate.get(name)
+                        if last is None or e["created_at"] > last["created_at"]:
+                            rv.last_boilerplate[name] = e
+                        if name == "ci_test_result":
+                            rv.ci_results_hashes.update(
+                                CI_RESULTS_HASH_RE.findall(e["body"])
+                            )
+
+    return rv
+
+
+def get_gh_objects(obj_name: str) -> list[tuple[str, str, datetime.datetime]]:
+    # cursors are opaque so pages cannot be requested out of order, instead
+    # walk the list from both ends concurrently and stop where the walks meet
+    asc = {}
+    desc = {}
+    lock = threading.Lock()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(walk_gh_objects, obj_name, "ASC", asc, desc, lock),
+            executor.submit(walk_gh_objects, obj_name, "DESC", desc, asc, lock),
+        ]
+        for future in futures:
+            future.result()
+
+    return list((asc | desc).values())
+
+
+def walk_gh_objects(
+    obj_name: str,
+    direction: str,
+    found: dict[str, tuple[str, str, datetime.datetime]],
+    found_by_other: dict[str, tuple[str, str, datetime.datetime]],
+    lock: threading.Lock,
+) -> None:
+    variables = {"field": "CREATED_AT", "direction": direction}
     while True:
-        resp = send_query(
-            json.dumps(
-                {
-                    "query": query,
-                    "variables": variables,
-                }
-            )
-        )
-        data = resp.json()["data"]
-        logging.info(data["rateLimit"])
+        page, page_info = get_gh_objects_page(obj_name, variables)
+        with lock:
+            met = not found_by_other.keys().isdisjoint(page)
+            found.update(page)
 
-        objs = data["repository"][obj_name]
-        for node in objs["nodes"]:
-            updated_ats = [
-                node["updatedAt"],
-                node["timelineItems"]["updatedAt"],
-            ]
-            if obj_name == "pullRequests":
-                last_commit = node["commits"]["nodes"][0]["commit"]
-                if ci_results := last_commit["checkSuites"]["nodes"]:
-                    updated_ats.append(ci_results[0]["updatedAt"])
-            rv.append(
-                (
-                    str(node["number"]),
-                    max(map(datetime.datetime.fromisoformat, updated_ats)),
-                )
-            )
+        if met or not page_info["hasNextPage"]:
+            break
+        variables["after"] = page_info["endCursor"]
 
-        if objs["pageInfo"]["hasNextPage"]:
-            variables["after"] = objs["pageInfo"]["endCursor"]
-        else:
+
+def get_updated_gh_objects(
+    obj_name: str,
+    triaged: dict[str, tuple[datetime.datetime, datetime.datetime]],
+) -> list[tuple[str, str, datetime.datetime]]:
+    # most recently updated first, stop at the first page with nothing new
+    rv = []
+    variables = {"field": "UPDATED_AT", "direction": "DESC"}
+    while True:
+        page, page_info = get_gh_objects_page(obj_name, variables)
+        rv.extend(page.values())
+        if not page_info["hasNextPage"] or all(
+            number in triaged and triaged[number][0] >= updated_at
+            for number, _, updated_at in page.values()
+        ):
             break
+        variables["after"] = page_info["endCursor"]
 
     return rv
 
 
-def fetch_object(
-    number: str,
-    obj: GH_OBJ_T,
-    object_name: str,
-    updated_at: t.Optional[datetime.datetime] = None,
-) -> GH_OBJ:
-    query = QUERY_SINGLE_ISSUE if object_name == "issue" else QUERY_SINGLE_PR
+def get_gh_objects_page(
+    obj_name: str, variables: dict[str, str]
+) -> tuple[dict[str, tuple[str, str, datetime.datetime]], dict[str, t.Any]]:
+    query = QUERY_ISSUE_NUMBERS if obj_name == "issues" else QUERY_PR_NUMBERS
     resp = send_query(
-        json.dumps(
+        json_dumpb(
             {
                 "query": query,
-                "variables": {"number": int(number)},
+                "variables": variables,
             }
+        ),
+        read_only=True,
+    )
+    data = resp.json()["data"]
+    logging.info(data["rateLimit"])
+
+    objs = data["repository"][obj_name]
+    page = {}
+    for node in objs["nodes"]:
+        updated_ats = [
+            node["updatedAt"],
+            node["timelineItems"]["updatedAt"],
+        ]
+        if obj_name == "pullRequests":
+            last_commit = node["commits"]["nodes"][0]["commit"]
+            if ci_results := last_commit["checkSuites"]["nodes"]:
+                updated_ats.append(ci_results[0]["updatedAt"])
+        number = str(node["number"])
+        page[number] = (
+            number,
+            node["id"],
+            # all in UTC with the same format, compare as strings
+            parse_datetime(max(updated_ats)),
         )
+
+    return page, objs["pageInfo"]
+
+
+def fetch_objects_by_id(
+    objs: list[tuple[str, datetime.datetime]],
+) -> list[GH_OBJ]:
+    resp = send_query(
+        json_dumpb(
+            {
+                "query": QUERY_NODES,
+                "variables": {"ids": [node_id for node_id, _ in objs]},
+            }
+        ),
+        read_only=True,
     )
     data = resp.json()["data"]
     logging.info(data["rateLimit"])
-    o = data["repository"][object_name]
-    if o is None:
-        raise ValueError(f"{number} not found")
 
+    rv = []
+    for o, (node_id, updated_at) in zip(data["nodes"], objs):
+        if o is None:
+            # deleted or transferred since the numbers were listed
+            logging.info(f"{node_id} not found")
+            continue
+        fetch_remaining_timeline(o)
+        rv.append(
+            build_object(
+                o,
+                PR if o["__typename"] == "PullRequest" else Issue,
+                updated_at,
+            )
+        )
+
+    return rv
+
+
+def fetch_remaining_timeline(o: dict[str, t.Any]) -> None:
+    timeline = o["timelineItems"]
+    while timeline["pageInfo"]["hasNextPage"]:
+        resp = send_query(
+            json_dumpb(
+                {
+                    "query": QUERY_TIMELINE,
+                    "variables": {
+                        "id": o["id"],
+                        "after": timeline["pageInfo"]["endCursor"],
+                    },
+                }
+            ),
+            read_only=True,
+        )
+        data = resp.json()["data"]
+        logging.info(data["rateLimit"])
+        page = data["node"]["timelineItems"]
+        timeline["nodes"].extend(page["nodes"])
+        timeline["pageInfo"] = page["pageInfo"]
+
+
+def build_object(
+    o: dict[str, t.Any],
+    obj: GH_OBJ_T,
+    updated_at: t.Optional[datetime.datetime] = None,
+) -> GH_OBJ:
+    events = process_events(o)
     kwargs = dict(
         id=o["id"],
         author=o["author"]["login"] if o["author"] else "ghost",
         number=o["number"],
         title=o["title"],
         body=o["body"],
-        events=process_events(o),
+        events=events,
+        event_index=index_events(events),
         labels={node["name"]: node["id"] for node in o["labels"].get("nodes", [])},
         updated_at=updated_at,
         components=[],
         last_triaged=datetime.datetime.now(datetime.timezone.utc),
     )
-    if object_name == "pullRequest":
+    if obj is PR:
         kwargs["branch"] = o["baseRef"]["name"]
         kwargs["files"] = [f["path"] for f in o["files"]["nodes"]]
         kwargs["mergeable"] = o["mergeable"].lower()
@@ -1443,10 +2092,8 @@ def fetch_object(
             (r["updatedAt"] for r in o["reviews"]["nodes"]), default=None
         )
         if kwargs["last_review"]:
-            kwargs["last_review"] = datetime.datetime.fromisoformat(
-                kwargs["last_review"]
-            )
-        kwargs["last_commit"] = datetime.datetime.fromisoformat(
+            kwargs["last_review"] = parse_datetime(kwargs["last_review"])
+        kwargs["last_commit"] = parse_datetime(
             o["last_commit"]["nodes"][0]["commit"]["committedDate"]
         )
         if check_suite := o["last_commit"]["nodes"][0]["commit"]["checkSuites"][
@@ -1462,7 +2109,7 @@ def fetch_object(
                 ).group("buildId"),
                 conclusion=conclusion,
                 status=check_suite["status"].lower(),
-                updated_at=datetime.datetime.fromisoformat(check_suite["updatedAt"]),
+                updated_at=parse_datetime(check_suite["updatedAt"]),
             )
         else:
             kwargs["ci"] = None
@@ -1479,73 +2126,123 @@ def fetch_object(
 
 
 def fetch_object_by_number(number: str) -> GH_OBJ:
-    try:
-        obj = fetch_object(number, Issue, "issue")
-    except ValueError:
-        obj = fetch_object(number, PR, "pullRequest")
+    resp = send_query(
+        json_dumpb(
+            {
+                "query": QUERY_SINGLE,
+                "variables": {"number": int(number)},
+            }
+        ),
+        read_only=True,
+    )
+    data = resp.json()["data"]
+    logging.info(data["rateLimit"])
+    for object_name, obj in (("issue", Issue), ("pullRequest", PR)):
+        if (o := data["repository"][object_name]) is not None:
+            fetch_remaining_timeline(o)
+            return build_object(o, obj)
 
-    return obj
+    raise ValueError(f"{number} not found")
 
 
-def fetch_objects() -> dict[str, GH_OBJ]:
-    with shelve.open(CACHE_FILENAME) as cache:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+def open_objects_cache() -> sqlite3.Connection:
+    db = sqlite3.connect(OBJECTS_CACHE_FILENAME)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS objects ("
+        "number INTEGER PRIMARY KEY, updated_at TEXT, last_triaged TEXT"
+        ")"
+    )
+    return db
+
+
+def fetch_objects(full_listing: bool = True) -> dict[str, GH_OBJ]:
+    with contextlib.closing(open_objects_cache()) as db:
+        triaged = {
+            str(number): (
+                parse_datetime(updated_at),
+                parse_datetime(last_triaged),
+            )
+            for number, updated_at, last_triaged in db.execute(
+                "SELECT number, updated_at, last_triaged FROM objects"
+            )
+        }
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        if full_listing:
             futures = {
                 executor.submit(get_gh_objects, "issues"): "issues",
                 executor.submit(get_gh_objects, "pullRequests"): "prs",
             }
-            number_map = collections.defaultdict(list)
-            for future in concurrent.futures.as_completed(futures):
-                issue_type = futures[future]
-                number_map[issue_type] = [
-                    (number, updated_at)
-                    for number, updated_at in future.result()
-                    if number not in cache
-                    or cache[str(number)].updated_at < updated_at
-                    or days_since(cache[str(number)].last_triaged) >= STALE_ISSUE_DAYS
-                ]
-
-        if not number_map["issues"] and not number_map["prs"]:
-            return {}
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            futures = []
-            for object_name, obj, data in (
-                ("issue", Issue, number_map["issues"]),
-                ("pullRequest", PR, number_map["prs"]),
-            ):
-                for number, updated_at in data:
-                    futures.append(
-                        executor.submit(
-                            fetch_object,
-                            number,
-                            obj,
-                            object_name,
-                            updated_at,
-                        )
-                    )
+        else:
+            # finished CI runs do not bump updatedAt of PRs so those are always
+            # listed in full, new cross references of issues are picked up by
+            # the next full listing
+            futures = {
+                executor.submit(get_updated_gh_objects, "issues", triaged): "issues",
+                executor.submit(get_gh_objects, "pullRequests"): "prs",
+            }
+        number_map = collections.defaultdict(list)
+        for future in concurrent.futures.as_completed(futures):
+            issue_type = futures[future]
+            number_map[issue_type] = [
+                (node_id, updated_at)
+                for number, node_id, updated_at in future.result()
+                if number not in triaged
+                or triaged[number][0] < updated_at
+                or days_since(triaged[number][1], now) >= STALE_ISSUE_DAYS
+            ]
+
+    if not number_map["issues"] and not number_map["prs"]:
+        return {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HTTP_WORKERS) as executor:
+        to_fetch = number_map["issues"] + number_map["prs"]
+        futures = [
+            executor.submit(fetch_objects_by_id, to_fetch[i : i + FETCH_BATCH_SIZE])
+            for i in range(0, len(to_fetch), FETCH_BATCH_SIZE)
+        ]
 
-            data = {}
-            for future in concurrent.futures.as_completed(futures):
-                obj = future.result()
+        data = {}
+        for future in concurrent.futures.as_completed(futures):
+            for obj in future.result():
                 data[str(obj.number)] = obj
 
-            cache.update(data)
-            return data
+        return data
 
 
 def daemon(dry_run: t.Optional = None) -> None:
     global request_counter
+    last_full_listing = 0.0
     while True:
         request_counter = 0
         start = time.time()
-        objs = fetch_objects()
+        # a full listing also picks up objects due for the periodic refresh
+        full_listing = start - last_full_listing >= FULL_LISTING_SECONDS
+        objs = fetch_objects(full_listing)
+        if full_listing:
+            last_full_listing = start
         if objs:
-            triage(objs, dry_run)
-            with shelve.open(CACHE_FILENAME) as cache:
-                for number, obj in objs.items():
-                    obj.last_triaged = datetime.datetime.now(datetime.timezone.utc)
-                    cache[str(number)] = obj
+            failed = triage(objs, dry_run)
+            now = datetime.datetime.now(datetime.timezone.utc)
+            # objects whose mutations failed are triaged again in the next iteration
+            triaged = [obj for obj in objs.values() if obj.number not in failed]
+            for obj in triaged:
+                obj.last_triaged = now
+            with contextlib.closing(open_objects_cache()) as db, db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO objects (number, updated_at, last_triaged)"
+                    " VALUES (?, ?, ?)",
+                    (
+                        (
+                            obj.number,
+                            obj.updated_at.isoformat(),
+                            obj.last_triaged.isoformat(),
+                        )
+                        for obj in triaged
+                    ),
+                )
             logging.info(
                 f"Took {time.time() - start:.2f} seconds to triage {len(objs)} issues/PRs"
                 f" and {request_counter} HTTP requests"
@@ -1575,6 +2272,8 @@ def main() -> None:
         level=logging.DEBUG if args.debug else logging.INFO,
         stream=sys.stderr,
     )
+    load_label_ids()
+    load_collections_cache()
     if args.number:
         obj = fetch_object_by_number(args.number)
         triage({args.number: obj}, dry_run=args.dry_run)